@@ -268,6 +268,24 @@ def add_train_params(parser):
         default="",
         help="The path to save the final trained model",
     )
+    parser.add_argument(
+        "--embedding_grads_dtype",
+        choices=["float32", "bfloat16"],
+        default="float32",
+        help="The data type used by workers to report the gradients of "
+        "embedding layers. bfloat16 halves the size of these gradients "
+        "on the wire at the cost of precision",
+    )
+    parser.add_argument(
+        "--embedding_cache_capacity",
+        type=non_neg_int,
+        default=0,
+        help="The maximum memory in bytes used by master to cache the "
+        "embedding vectors of ElasticDL Embedding layers. Besides the "
+        "vector data, each cached vector costs about 300 bytes of Python "
+        "objects, which is counted in. Keep it well below the memory of "
+        "master. If 0, the cache is disabled",
+    )
 
 
 def add_evaluate_params(parser):
@@ -33,3 +33,10 @@ class Mode(object):
 
 class Redis(object):
     MAX_COMMAND_RETRY_TIMES = 10
+
+
+class GradientAggregation(object):
+    # Gradients larger than this many float32 elements (256KB) are split
+    # into chunks which are accumulated in parallel.
+    CHUNK_SIZE = 64 * 1024
+    THREAD_NUM = 4
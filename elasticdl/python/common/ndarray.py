@@ -8,14 +8,17 @@ def tensor_to_ndarray(tensor_pb):
     """
     Create an ndarray from Tensor proto message. Note: upon return, the input
     tensor message is reset and underlying buffer passed to the returned
-    ndarray.
+    ndarray. The returned float32 ndarray is a read-only view on the buffer
+    without copying, copy it before modifying it in place.
     """
 
     if not tensor_pb.dim:
         raise ValueError("Tensor PB has no dim defined")
 
+    is_bfloat16 = tensor_pb.dtype == elasticdl_pb2.BFLOAT16
     # Check that the buffer size agrees with dimensions.
-    size = 4  # A float32 item occupies 4 bytes
+    # A float32 item occupies 4 bytes, and a bfloat16 item 2 bytes.
+    size = 2 if is_bfloat16 else 4
     for d in tensor_pb.dim:
         size *= d
     if size != len(tensor_pb.content):
@@ -24,32 +27,132 @@ def tensor_to_ndarray(tensor_pb):
             tensor_pb.dim,
             len(tensor_pb.content),
         )
-    if not tensor_pb.indices:
-        arr = np.ndarray(
-            shape=tensor_pb.dim, dtype=np.float32, buffer=tensor_pb.content
+    if is_bfloat16:
+        # Restore float32 values by padding the lower 16 bits with zeros.
+        values = np.ndarray(
+            shape=tensor_pb.dim, dtype=np.uint16, buffer=tensor_pb.content
         )
+        values = np.left_shift(values.astype(np.uint32), 16).view(np.float32)
     else:
         values = np.ndarray(
             shape=tensor_pb.dim, dtype=np.float32, buffer=tensor_pb.content
         )
-        indices = tf.convert_to_tensor(tensor_pb.indices)
+    if not tensor_pb.indices:
+        arr = values
+    else:
+        # Keep indices as ndarray so that checking them on master does not
+        # dispatch TensorFlow ops.
+        indices = np.array(tensor_pb.indices, dtype=np.int32)
         arr = tf.IndexedSlices(values, indices)
     tensor_pb.Clear()
 
     return arr
 
 
-def ndarray_to_tensor(arr, indices=None):
-    """Convert ndarray to Tensor PB"""
+def ndarray_to_tensor(
+    arr, indices=None, tensor=None, dtype=elasticdl_pb2.FLOAT32
+):
+    """
+    Convert ndarray to Tensor PB. If `tensor` is given, e.g. a map entry of
+    an enclosing message, it is filled in place to avoid the extra buffer
+    copy done by `CopyFrom`. With `dtype` being `elasticdl_pb2.BFLOAT16`,
+    the values are rounded to bfloat16 to halve the size of the content.
+    """
 
     if arr.dtype != np.float32:
         raise ValueError(
             "expected ndarray to be of float32 type, got %s type", arr.dtype
         )
-    tensor = elasticdl_pb2.Tensor()
+    if tensor is None:
+        tensor = elasticdl_pb2.Tensor()
+    else:
+        tensor.Clear()
     tensor.dim.extend(arr.shape)
+    if dtype == elasticdl_pb2.BFLOAT16:
+        arr = _float32_to_bfloat16(arr)
     tensor.content = arr.tobytes()
+    tensor.dtype = dtype
     if indices:
         tensor.indices.extend(indices)
 
     return tensor
+
+
+def _float32_to_bfloat16(arr):
+    """
+    Round a float32 ndarray to nearest even bfloat16 values, returned as
+    their uint16 bit patterns. Truncating the lower 16 bits instead would
+    bias the values towards zero, and could turn NaNs into infinities.
+    """
+
+    bits = np.ascontiguousarray(arr).view(np.uint32)
+    rounding_bias = np.uint32(0x7FFF) + ((bits >> 16) & np.uint32(1))
+    res = ((bits + rounding_bias) >> 16).astype(np.uint16)
+    res[np.isnan(arr)] = 0x7FC0
+    return res
+
+
+def ndarrays_to_packed_tensors(named_arrays, packed_pb=None):
+    """
+    Pack a <name, float32 ndarray> dict into PackedTensors PB, with the
+    content of all the ndarrays in a single buffer.
+    """
+
+    if packed_pb is None:
+        packed_pb = elasticdl_pb2.PackedTensors()
+    arrays = []
+    for name, arr in named_arrays.items():
+        if arr.dtype != np.float32:
+            raise ValueError(
+                "expected ndarray to be of float32 type, got %s type",
+                arr.dtype,
+            )
+        packed_pb.name.append(name)
+        packed_pb.ndim.append(arr.ndim)
+        packed_pb.dim.extend(arr.shape)
+        arrays.append(arr.reshape(-1))
+    if arrays:
+        packed_pb.content = np.concatenate(arrays).tobytes()
+    return packed_pb
+
+
+def packed_tensors_to_ndarrays(packed_pb):
+    """
+    Create a <name, ndarray> dict from PackedTensors PB. The ndarrays are
+    read-only views on the content of the message.
+    """
+
+    content = packed_pb.content
+    arrays = {}
+    offset = 0
+    dim_start = 0
+    for name, ndim in zip(packed_pb.name, packed_pb.ndim):
+        dim_end = dim_start + ndim
+        shape = tuple(packed_pb.dim[dim_start:dim_end])
+        dim_start = dim_end
+        count = int(np.prod(shape))
+        if offset + 4 * count > len(content):
+            raise ValueError(
+                "PackedTensors PB size mismatch, len(content): %d",
+                len(content),
+            )
+        arrays[name] = np.frombuffer(
+            content, dtype=np.float32, count=count, offset=offset
+        ).reshape(shape)
+        offset += 4 * count
+    if offset != len(content):
+        raise ValueError(
+            "PackedTensors PB size mismatch, len(content): %d", len(content)
+        )
+    return arrays
+
+
+def pb_model_to_ndarrays(pb_model):
+    """
+    Create a <name, ndarray> dict of the parameters in Model PB, from both
+    `param` and `packed_param`.
+    """
+
+    params = {k: tensor_to_ndarray(v) for k, v in pb_model.param.items()}
+    params.update(packed_tensors_to_ndarrays(pb_model.packed_param))
+    return params
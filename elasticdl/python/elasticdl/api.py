@@ -83,6 +83,10 @@ def train(args):
         args.model_def,
         "--model_params",
         args.model_params,
+        "--embedding_grads_dtype",
+        args.embedding_grads_dtype,
+        "--embedding_cache_capacity",
+        str(args.embedding_cache_capacity),
     ]
     container_args.extend(["--image_pull_policy", args.image_pull_policy])
     container_args.extend(["--restart_policy", args.restart_policy])
@@ -1,7 +1,16 @@
+import functools
+
 import tensorflow as tf
 from tensorflow.python.keras.utils import tf_utils
 
 
+@functools.lru_cache(maxsize=None)
+def _key_prefix(name_prefix):
+    # Key prefixes are built from a few layer and slot names, memoize them
+    # as they are used in every lookup and update of embedding vectors.
+    return Embedding.get_key(name_prefix) + "-"
+
+
 class Embedding(tf.keras.layers.Layer):
     """
     Input: indexes for the embedding entries with a shape of
@@ -86,6 +95,18 @@ class Embedding(tf.keras.layers.Layer):
     def get_key(name_list):
         return "-".join(map(str, name_list))
 
+    @staticmethod
+    def get_keys(name_prefix, ids):
+        """
+        Batch version of `get_key`, returns the keys of
+        `name_prefix + [id]` for each id in `ids`.
+        """
+        prefix = _key_prefix(tuple(name_prefix))
+        # `ndarray.tolist` avoids boxing numpy scalars one by one.
+        if hasattr(ids, "tolist"):
+            ids = ids.tolist()
+        return [prefix + str(i) for i in ids]
+
     def lookup_embedding(self, unique_ids):
         batch_embedding = self.lookup_func(
             unique_ids.numpy(),
@@ -0,0 +1,85 @@
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingCache(object):
+    """
+    LRU cache of embedding vectors on master, keyed by the embedding keys
+    used in EmbeddingService.
+
+    Master is the only one updating existing embedding vectors in
+    EmbeddingService (workers only initialize unknown ones), so the cache
+    stays consistent as long as master updates it together with
+    EmbeddingService.
+    """
+
+    # Estimated bytes of the Python objects of a cached vector besides its
+    # data: the ndarray header, the key string and the OrderedDict entry.
+    ENTRY_OVERHEAD_BYTES = 300
+
+    def __init__(self, capacity):
+        """
+        Arguments:
+            capacity: The maximum bytes of the cached embedding vectors,
+                including `ENTRY_OVERHEAD_BYTES` per vector. The least
+                recently used ones are evicted beyond it.
+        """
+        self._capacity = capacity
+        self._cache = OrderedDict()
+        self._nbytes = 0
+
+    def __len__(self):
+        return len(self._cache)
+
+    @property
+    def nbytes(self):
+        """The estimated bytes of the cached embedding vectors."""
+        return self._nbytes
+
+    def _entry_nbytes(self, vector):
+        return vector.nbytes + self.ENTRY_OVERHEAD_BYTES
+
+    def lookup(self, keys):
+        """
+        Arguments:
+            keys: The list of embedding keys.
+
+        Returns:
+            A tuple contains embedding_vectors and missed_keys_idx.
+            embedding_vectors: A list of the cached embedding vectors,
+            `None` for the keys not in the cache.
+            missed_keys_idx: The index of the keys not in the cache.
+        """
+        embedding_vectors = []
+        missed_keys_idx = []
+        for index, key in enumerate(keys):
+            vector = self._cache.get(key)
+            if vector is None:
+                missed_keys_idx.append(index)
+            else:
+                self._cache.move_to_end(key)
+            embedding_vectors.append(vector)
+        return embedding_vectors, missed_keys_idx
+
+    def update(self, keys, embedding_vectors):
+        """
+        Set the embedding vectors of `keys` in the cache. The vectors are
+        copied, so that the cache does not keep alive the arrays they may
+        be views on.
+        """
+        for key, vector in zip(keys, embedding_vectors):
+            vector = np.array(vector)
+            old_vector = self._cache.get(key)
+            if old_vector is not None:
+                self._nbytes -= self._entry_nbytes(old_vector)
+            self._cache[key] = vector
+            self._cache.move_to_end(key)
+            self._nbytes += self._entry_nbytes(vector)
+        while self._nbytes > self._capacity:
+            _, vector = self._cache.popitem(last=False)
+            self._nbytes -= self._entry_nbytes(vector)
+
+    def clear(self):
+        self._cache.clear()
+        self._nbytes = 0
@@ -216,6 +216,7 @@ def main():
         checkpoint_service=checkpoint_service,
         evaluation_service=evaluation_service,
         embedding_service_endpoint=embedding_service_endpoint,
+        embedding_cache_capacity=args.embedding_cache_capacity,
     )
     elasticdl_pb2_grpc.add_MasterServicer_to_server(master_servicer, server)
     server.add_insecure_port("[::]:{}".format(args.port))
@@ -252,6 +253,8 @@ def main():
             str(args.minibatch_size),
             "--embedding_service_endpoint",
             str(embedding_service_endpoint),
+            "--embedding_grads_dtype",
+            args.embedding_grads_dtype,
         ]
 
         env_dict = parse_envs(args.envs)
@@ -294,6 +297,7 @@ def main():
             if task_d.finished():
                 if worker_manager:
                     worker_manager.update_status(WorkerManagerStatus.FINISHED)
+                master_servicer.wait_for_checkpoints()
                 if args.output:
                     master_servicer.save_latest_checkpoint(args.output)
                 break
@@ -268,9 +268,7 @@ class OptimizerWrapper(object):
 
             # generate embedding keys
             start = len(embed_keys)
-            embed_keys.extend(
-                [Embedding.get_key([layer_name, i]) for i in unique_ids]
-            )
+            embed_keys.extend(Embedding.get_keys([layer_name], unique_ids))
             end = len(embed_keys)
             embed_key_index[layer_name] = (start, end)
 
@@ -278,10 +276,7 @@ class OptimizerWrapper(object):
             for slot in self._allowed_slot_names:
                 start = len(slot_keys)
                 slot_keys.extend(
-                    [
-                        Embedding.get_key([layer_name, slot, i])
-                        for i in unique_ids
-                    ]
+                    Embedding.get_keys([layer_name, slot], unique_ids)
                 )
                 end = len(slot_keys)
                 slot_key_index.setdefault(layer_name, {}).setdefault(
@@ -1,20 +1,25 @@
+import queue
 import threading
+from concurrent import futures
 
 import numpy as np
 import tensorflow as tf
 from google.protobuf import empty_pb2
 
 from elasticdl.proto import elasticdl_pb2, elasticdl_pb2_grpc
+from elasticdl.python.common.constants import GradientAggregation
 from elasticdl.python.common.file_helper import copy_if_not_exists
 from elasticdl.python.common.log_util import default_logger as logger
 from elasticdl.python.common.model_helper import load_from_checkpoint_file
 from elasticdl.python.common.ndarray import (
     ndarray_to_tensor,
+    ndarrays_to_packed_tensors,
     tensor_to_ndarray,
 )
 from elasticdl.python.common.tensor_helper import merge_indexed_slices
 from elasticdl.python.elasticdl.layers.embedding import Embedding
 from elasticdl.python.master.checkpoint_service import CheckpointService
+from elasticdl.python.master.embedding_cache import EmbeddingCache
 from elasticdl.python.master.embedding_service import EmbeddingService
 
 
@@ -32,28 +37,91 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
         checkpoint_filename_for_init,
         checkpoint_service,
         evaluation_service,
-        embedding_service_endpoint=None
+        embedding_service_endpoint=None,
+        embedding_cache_capacity=0
     ):
         # TODO: group params together into a single object.
         self._opt = optimizer
+        # SGD updates are linear in the learning rate, so averaging the
+        # dense gradients is folded into the learning rate instead of
+        # dividing them on every model update. Note that this divides the
+        # learning rate of the given `optimizer` by `grads_to_wait`. The
+        # sparse gradients, which are not averaged, are scaled back in
+        # `_update_model`.
+        self._skip_grad_division = (
+            grads_to_wait > 1
+            and isinstance(optimizer, tf.keras.optimizers.SGD)
+            # Learning rate schedules and other callables are not divided.
+            and not callable(optimizer.learning_rate)
+        )
+        if self._skip_grad_division:
+            optimizer.learning_rate = optimizer.learning_rate / grads_to_wait
         self._task_d = task_d
         self._lock = threading.Lock()
         self._gradient_sum = {}
+        # <name, list of tf.IndexedSlices> maps of the reported gradients
+        # of ElasticDL Embedding layers and Keras Embedding layers, only
+        # merged once in `_update_model` to avoid re-concatenating the
+        # gradients received so far on each report.
         self._edl_embedding_gradients = {}
         self._gradient_sum_indexed = {}
+        # A <layer name, tf.Variable> map of variables reused across model
+        # updates to hold the embedding vectors of ElasticDL Embedding
+        # layers. Only the first rows, one per unique id, are used.
+        self._edl_embedding_vars = {}
+        # The rows of the variables are bound to different ids in every
+        # model update, while optimizer slots are kept per variable. So
+        # the variables are only reused with optimizers without slots.
+        self._reuse_edl_embedding_vars = (
+            isinstance(optimizer, tf.keras.optimizers.SGD)
+            and not optimizer.get_config()["momentum"]
+        )
+        # A <layer name, ndarray> map of host buffers reused to stack the
+        # looked-up embedding vectors of ElasticDL Embedding layers.
+        self._edl_embedding_buffers = {}
         self._grad_to_wait = grads_to_wait
         self._grad_n = 0
         self._minibatch_size = minibatch_size
+        # NumPy releases the GIL for large element-wise ops, so chunks of
+        # big gradients can be accumulated by multiple threads at once.
+        # Created with the first gradient to split into chunks.
+        self._aggregation_pool = None
 
         # A <string, tf.ResourceVariable> map. We use tf.ResourceVariable
         # instead ndarray to avoid copying and conversion when calling
         # optimizer's apply_gradients() function.
         self._model = {}
         self._version = 0
+        # Serialized `elasticdl_pb2.Model` of `self._cached_pb_version`,
+        # shared by all the `GetModel` calls of the same model version.
+        # A <packed, bytes> map with the models with parameters packed or
+        # not, see `GetModelRequest.packed`.
+        self._cached_pb_bytes = {}
+        self._cached_pb_version = -1
+        # Increased when model variables are added or replaced without
+        # changing the model version, so that a model serialized out of
+        # the lock is not cached if the variables changed meanwhile.
+        self._model_generation = 0
         self._embedding_service_endpoint = embedding_service_endpoint
+        # Embedding vectors of ElasticDL Embedding layers recently looked up
+        # or updated by master, bounded to `embedding_cache_capacity` bytes.
+        # None if `embedding_cache_capacity` is 0.
+        self._embedding_cache = (
+            EmbeddingCache(embedding_cache_capacity)
+            if embedding_cache_capacity
+            else None
+        )
         self._init_model(checkpoint_filename_for_init, init_var)
 
         self._checkpoint_service = checkpoint_service
+        # Snapshots of the model to checkpoint, saved by a background thread
+        # out of the gradient reporting path. At most one snapshot waits in
+        # the queue, so that a slow disk throttles training instead of
+        # piling up model copies.
+        self._checkpoint_queue = queue.Queue(maxsize=1)
+        # Started with the first checkpoint to save, so that there is no
+        # such thread if checkpointing is disabled.
+        self._checkpoint_thread = None
         self._evaluation_service = evaluation_service
         if evaluation_service:
             evaluation_service.set_master_servicer(self)
@@ -67,6 +135,8 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
         self._model[name] = tf.Variable(
             value, name=MasterServicer.var_name_encode(name)
         )
+        self._model_generation += 1
+        self._cached_pb_version = -1
 
     def _init_model_from_var_list(self, var_list):
         for var in var_list:
@@ -117,30 +187,55 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
     def GetModel(self, request, _):
         self._validate_model_version(request.version)
 
-        if (
-            request.method == elasticdl_pb2.MINIMUM
-            or request.version == self._version
-        ):
-            with self._lock:
-                res = self._get_model_no_lock()
-            return res
+        # Decide whether to serve the current model under the same lock
+        # that snapshots it, so that a model update in between does not
+        # give a newer model to a request of a fixed version.
+        with self._lock:
+            version = self._version
+            is_current_model = (
+                request.method == elasticdl_pb2.MINIMUM
+                or request.version == version
+            )
+            pb_bytes = None
+            if is_current_model:
+                pb_bytes = self._get_cached_pb_bytes_no_lock(request.packed)
+                if pb_bytes is None:
+                    generation = self._model_generation
+                    # Only snapshot the variables under the lock, the
+                    # conversion and serialization are done out of it.
+                    params = {k: v.numpy() for k, v in self._model.items()}
+
+        if not is_current_model:
+            return self._get_checkpoint_model(request.version)
+        if pb_bytes is not None:
+            return elasticdl_pb2.Model.FromString(pb_bytes)
+
+        pb_model = self._params_to_pb_model(version, params, request.packed)
+        pb_bytes = pb_model.SerializeToString()
+        with self._lock:
+            if (
+                self._version == version
+                and self._model_generation == generation
+            ):
+                self._set_cached_pb_bytes_no_lock(request.packed, pb_bytes)
+        return pb_model
 
+    def _get_checkpoint_model(self, version):
         # Read from checkpoint for the fixed version model
         pb_model = elasticdl_pb2.Model()
         try:
-            pb_model = self._checkpoint_service.get_checkpoint_model(
-                request.version
-            )
+            pb_model = self._checkpoint_service.get_checkpoint_model(version)
         except Exception:
             logger.error(
                 "Failed to fetch checkpoint model for "
-                "model version {}".format(request.version)
+                "model version {}".format(version)
             )
         return pb_model
 
     def _update_model_version(self):
         assert self._lock.locked()
         self._version += 1
+        self._cached_pb_version = -1
 
     def _update_edl_embedding_table(self, name_var_list):
         """
@@ -151,13 +246,9 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
         keys = []
         embeddings = []
         for layer_name, unique_ids, embedding_var in name_var_list:
-            keys.extend(
-                [
-                    Embedding.get_key([layer_name, i])
-                    for i in unique_ids.numpy()
-                ]
-            )
-            embeddings.extend([i for i in embedding_var.numpy()])
+            ids_num = len(unique_ids)
+            keys.extend(Embedding.get_keys([layer_name], unique_ids))
+            embeddings.extend([i for i in embedding_var[:ids_num].numpy()])
 
         if embeddings:
             EmbeddingService.update_embedding(
@@ -165,6 +256,74 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
                 embedding_vectors=embeddings,
                 embedding_service_endpoint=self._embedding_service_endpoint,
             )
+            if self._embedding_cache is not None:
+                self._embedding_cache.update(keys, embeddings)
+
+    def _lookup_edl_embeddings(self, keys):
+        """
+        Look up the embedding vectors of `keys` from `self._embedding_cache`
+        and then EmbeddingService for the keys missed in the cache.
+        """
+        if self._embedding_cache is not None:
+            embeddings, missed_keys_idx = self._embedding_cache.lookup(keys)
+        else:
+            embeddings = [None] * len(keys)
+            missed_keys_idx = list(range(len(keys)))
+        if not missed_keys_idx:
+            return embeddings
+        missed_keys = [keys[i] for i in missed_keys_idx]
+        missed_embeddings, unknown_keys = EmbeddingService.lookup_embedding(
+            embedding_service_endpoint=self._embedding_service_endpoint,
+            keys=missed_keys,
+        )
+        if unknown_keys:
+            raise RuntimeError(
+                "Master reviced %d unknown embedding keys: %s ..."
+                % (len(unknown_keys), str(missed_keys[unknown_keys[0]]))
+            )
+        for i, embedding in zip(missed_keys_idx, missed_embeddings):
+            embeddings[i] = embedding
+        if self._embedding_cache is not None:
+            self._embedding_cache.update(missed_keys, missed_embeddings)
+        return embeddings
+
+    def _stack_edl_embeddings(self, layer_name, embeddings):
+        """
+        Stack the list of looked-up `embeddings` of ElasticDL Embedding
+        layer `layer_name` into its reusable host buffer with a single
+        copy, and return the 2-D view on the buffer.
+        """
+        ids_num, dim = len(embeddings), embeddings[0].size
+        size = ids_num * dim
+        buf = self._edl_embedding_buffers.get(layer_name)
+        if buf is None or buf.size < size:
+            buf = np.empty(2 * size, dtype=np.float32)
+            self._edl_embedding_buffers[layer_name] = buf
+        flat = buf[:size]
+        out = flat if embeddings[0].ndim == 1 else flat.reshape(ids_num, dim)
+        np.concatenate(embeddings, axis=0, out=out)
+        return flat.reshape(ids_num, dim)
+
+    def _get_edl_embedding_var(self, layer_name, embeddings):
+        """
+        Return the reusable variable of ElasticDL Embedding layer
+        `layer_name` with its first rows assigned by `embeddings`. The
+        variable is only re-created when it is too small, or every time
+        if the optimizer has slots.
+        """
+        if not self._reuse_edl_embedding_vars:
+            return tf.Variable(embeddings)
+        ids_num, dim = embeddings.shape
+        var = self._edl_embedding_vars.get(layer_name)
+        if var is None or var.shape[1] != dim or var.shape[0] < ids_num:
+            capacity = ids_num
+            if var is not None and var.shape[1] == dim:
+                # Grow geometrically to amortize the re-creations.
+                capacity = max(ids_num, 2 * var.shape[0])
+            var = tf.Variable(tf.zeros([capacity, dim], dtype=tf.float32))
+            self._edl_embedding_vars[layer_name] = var
+        var[:ids_num].assign(embeddings)
+        return var
 
     def _update_model(self):
         assert self._lock.locked()
@@ -172,54 +331,66 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
 
         # (grad, var) pairs excluding keras Embedding layer and
         # ElasticDL Embedding layer
-        for k in self._gradient_sum:
-            self._gradient_sum[k] = self._gradient_sum[k] / self._grad_to_wait
-            grad_var.append((self._gradient_sum[k], self._model[k]))
+        for k, grad in self._gradient_sum.items():
+            if self._grad_to_wait > 1 and not self._skip_grad_division:
+                np.true_divide(grad, self._grad_to_wait, out=grad)
+            grad_var.append((grad, self._model[k]))
 
         # (grad, var) pair of Keras Embedding layer
-        for k in self._gradient_sum_indexed:
-            grad_var.append((self._gradient_sum_indexed[k], self._model[k]))
+        for k, grads in self._gradient_sum_indexed.items():
+            grads = merge_indexed_slices(*grads)
+            if self._skip_grad_division:
+                grads = tf.IndexedSlices(
+                    grads.values * self._grad_to_wait, grads.indices
+                )
+            grad_var.append((grads, self._model[k]))
 
         # (grad, var) pair of ElasticDL Embedding layer
         edl_embedding_offset = len(grad_var)
-        unique_ids_list = []
-        if self._edl_embedding_gradients:
-            for layer_name, grads in self._edl_embedding_gradients.items():
-                unique_ids, idx = tf.unique(grads.indices)
-                unique_ids_list.append(unique_ids)
-                grads_idx_transformed = tf.IndexedSlices(grads.values, idx)
-                keys = [
-                    Embedding.get_key([layer_name, i])
-                    for i in unique_ids.numpy()
-                ]
-                embeddings, unknown_keys = EmbeddingService.lookup_embedding(
-                    embedding_service_endpoint=(
-                        self._embedding_service_endpoint
-                    ),
-                    keys=keys,
-                )
-                if unknown_keys:
-                    raise RuntimeError(
-                        "Master reviced %d unknown embedding keys: %s ..."
-                        % (len(unknown_keys), str(unknown_keys[0]))
-                    )
-                if not embeddings:
-                    continue
-                embeddings = np.concatenate(embeddings, axis=0).reshape(
-                    len(keys), -1
-                )
-                embedding_var = tf.Variable(embeddings)
-                grad_var.append((grads_idx_transformed, embedding_var))
+        edl_embedding_grads = []
+        keys = []
+        for layer_name, grads in self._edl_embedding_gradients.items():
+            # The gradients are host ndarrays from the requests, dedupe
+            # them with NumPy rather than launching TF kernels.
+            values = np.concatenate([g.values for g in grads])
+            if self._skip_grad_division:
+                values *= self._grad_to_wait
+            unique_ids, idx = np.unique(
+                np.concatenate([g.indices for g in grads]), return_inverse=True
+            )
+            if not len(unique_ids):
+                continue
+            grads_idx_transformed = tf.IndexedSlices(
+                tf.convert_to_tensor(values), tf.convert_to_tensor(idx)
+            )
+            edl_embedding_grads.append(
+                (layer_name, unique_ids, grads_idx_transformed)
+            )
+            keys.extend(Embedding.get_keys([layer_name], unique_ids))
+
+        # Look up the embedding vectors of all the layers together, with a
+        # single round trip to EmbeddingService.
+        embeddings = self._lookup_edl_embeddings(keys)
+        start = 0
+        for layer_name, unique_ids, grads in edl_embedding_grads:
+            end = start + len(unique_ids)
+            layer_embeddings = self._stack_edl_embeddings(
+                layer_name, embeddings[start:end]
+            )
+            start = end
+            embedding_var = self._get_edl_embedding_var(
+                layer_name, layer_embeddings
+            )
+            grad_var.append((grads, embedding_var))
 
         # TODO: support optimizer with slots such as Adam, FTRL
         self._opt.apply_gradients(grad_var)
 
         # report updated embedding table to EmbeddingService
         self._update_edl_embedding_table(
-            zip(
-                self._edl_embedding_gradients.keys(),
-                unique_ids_list,
-                [v for g, v in grad_var[edl_embedding_offset:]],
+            (layer_name, unique_ids, var)
+            for (layer_name, unique_ids, _), (_, var) in zip(
+                edl_embedding_grads, grad_var[edl_embedding_offset:]
             )
         )
         self._update_model_version()
@@ -252,7 +423,27 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
                 % self._version
             )
 
+    def _checkpoint_loop(self):
+        while True:
+            version, params = self._checkpoint_queue.get()
+            try:
+                logger.info("Saving checkpoint for model version %d" % version)
+                pb_model = self._params_to_pb_model(version, params)
+                self._checkpoint_service.save(version, pb_model, False)
+            except Exception:
+                logger.error(
+                    "Failed to save checkpoint file for model version %d"
+                    % version
+                )
+            finally:
+                self._checkpoint_queue.task_done()
+
+    def wait_for_checkpoints(self):
+        """Wait until the checkpoints scheduled so far are saved."""
+        self._checkpoint_queue.join()
+
     def save_latest_checkpoint(self, output_path):
+        self.wait_for_checkpoints()
         if self._checkpoint_service is None:
             self._checkpoint_service = CheckpointService(
                 checkpoint_dir="",
@@ -277,13 +468,57 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
             self._checkpoint_service
             and self._checkpoint_service.need_to_checkpoint(self._version)
         ):
-            self._save_checkpoint(locking=False, is_eval_checkpoint=False)
+            # The ndarrays are snapshots, not changed by the following
+            # model updates while being saved.
+            params = {k: v.numpy() for k, v in self._model.items()}
+            if self._checkpoint_thread is None:
+                self._checkpoint_thread = threading.Thread(
+                    target=self._checkpoint_loop,
+                    name="checkpoint",
+                    daemon=True,
+                )
+                self._checkpoint_thread.start()
+            self._checkpoint_queue.put((self._version, params))
 
-    def _get_model_no_lock(self):
+    @staticmethod
+    def _params_to_pb_model(version, params, packed=False):
+        """
+        Create `elasticdl_pb2.Model` from a <name, ndarray> dict, with the
+        parameters in `packed_param` if `packed` is True.
+        """
         pb_model = elasticdl_pb2.Model()
-        pb_model.version = self._version
-        for k, v in self._model.items():
-            pb_model.param[k].CopyFrom(ndarray_to_tensor(v.numpy()))
+        pb_model.version = version
+        if packed:
+            ndarrays_to_packed_tensors(params, pb_model.packed_param)
+        else:
+            for k, v in params.items():
+                ndarray_to_tensor(v, tensor=pb_model.param[k])
+        return pb_model
+
+    def _get_cached_pb_bytes_no_lock(self, packed):
+        if self._cached_pb_version != self._version:
+            return None
+        return self._cached_pb_bytes.get(packed)
+
+    def _set_cached_pb_bytes_no_lock(self, packed, pb_bytes):
+        if self._cached_pb_version != self._version:
+            self._cached_pb_bytes = {}
+            self._cached_pb_version = self._version
+        self._cached_pb_bytes[packed] = pb_bytes
+
+    def _get_model_no_lock(self):
+        # Callers may consume the returned message in place (e.g.
+        # `tensor_to_ndarray` clears the tensors), so only the serialized
+        # bytes are cached and every call gets its own message.
+        pb_bytes = self._get_cached_pb_bytes_no_lock(packed=False)
+        if pb_bytes is not None:
+            return elasticdl_pb2.Model.FromString(pb_bytes)
+        pb_model = self._params_to_pb_model(
+            self._version, {k: v.numpy() for k, v in self._model.items()}
+        )
+        self._set_cached_pb_bytes_no_lock(
+            packed=False, pb_bytes=pb_model.SerializeToString()
+        )
         return pb_model
 
     def _validate_model_version(self, request_model_version):
@@ -302,98 +537,133 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
                 self._init_model_from_tensor_dict(request.variable)
         return empty_pb2.Empty()
 
-    def ReportGradient(self, request, _):
-        model_version_valid = self._validate_model_version(
-            request.model_version
-        )
+    def _accumulate_gradients(self, grads):
+        """
+        Add the dense gradients in `grads` to `self._gradient_sum` in place.
+        Gradients larger than `GradientAggregation.CHUNK_SIZE` are split
+        into chunks and added by `self._aggregation_pool`.
+        """
+        assert self._lock.locked()
+        chunk_size = GradientAggregation.CHUNK_SIZE
+        chunks = []
+        for k, v in grads.items():
+            if k not in self._gradient_sum:
+                # `v` is a read-only view on the request buffer, copy
+                # it so the sum can be accumulated in place, unless it is
+                # the only gradient to apply and will not be modified.
+                if self._grad_to_wait > 1:
+                    v = v.copy()
+                self._gradient_sum[k] = v
+            elif v.size <= chunk_size:
+                np.add(self._gradient_sum[k], v, out=self._gradient_sum[k])
+            else:
+                # Both arrays are C-contiguous, so the flattened arrays
+                # and their slices are views.
+                grad_sum = self._gradient_sum[k].reshape(-1)
+                grad = v.reshape(-1)
+                for start in range(0, grad.size, chunk_size):
+                    end = start + chunk_size
+                    chunks.append((grad_sum[start:end], grad[start:end]))
+
+        if not chunks:
+            return
+        if self._aggregation_pool is None:
+            self._aggregation_pool = futures.ThreadPoolExecutor(
+                max_workers=GradientAggregation.THREAD_NUM
+            )
+        # Wait for all the chunks, and re-raise the error if any.
+        for _ in self._aggregation_pool.map(
+            lambda c: np.add(c[0], c[1], out=c[0]), chunks
+        ):
+            pass
 
-        res = elasticdl_pb2.ReportGradientResponse()
-        if not model_version_valid:
-            logger.warning(
-                "Task result for outdated version %d dropped",
-                request.model_version,
+    def _get_gradients(self, gradients):
+        """
+        Convert the `Tensor` protos in `gradients` to gradients and do
+        sanity check on them.
+        Returns a tuple of three dicts: dense gradients, gradients of Keras
+        Embedding layers and gradients of ElasticDL Embedding layers.
+        """
+        dense_grads = {}
+        indexed_grads = {}
+        edl_embedding_grads = {}
+        for k, v in gradients.items():
+            arr = tensor_to_ndarray(v)
+            is_indexed_slices = isinstance(arr, tf.IndexedSlices)
+            if k not in self._model:
+                if is_indexed_slices:
+                    # grads of ElasticDL Embedding layer
+                    # TODO: check arr.shape[1] = embedding_dim of this
+                    # EdlEmbedding layer
+                    edl_embedding_grads[k] = arr
+                    continue
+                else:
+                    raise ValueError(
+                        "Gradient key: %s is not part of model", k
+                    )
+
+            if is_indexed_slices:
+                self._check_indexed_gradient(k, arr)
+                indexed_grads[k] = arr
+            else:
+                # Read the shape from the variable directly to avoid
+                # copying the whole variable into a new ndarray.
+                if arr.shape != tuple(self._model[k].shape.as_list()):
+                    raise ValueError(
+                        "Gradient key: %s has incompatible dimension", k
+                    )
+                dense_grads[k] = arr
+        return dense_grads, indexed_grads, edl_embedding_grads
+
+    def _check_indexed_gradient(self, k, arr):
+        """Check the gradient `arr` of Keras Embedding layer variable `k`."""
+        model_shape = self._model[k].shape.as_list()
+        if arr.values.shape[1] != model_shape[1]:
+            raise ValueError(
+                "Gradient key: %s has incompatible "
+                "indexed slice dimension %d, expected %d"
+                % (k, arr.values.shape[1], model_shape[1])
+            )
+
+        max_index = arr.indices.max()
+        if max_index >= model_shape[0]:
+            raise ValueError(
+                "Gradient key: %s has wrong indices %d, "
+                "out of range %d" % (k, max_index, model_shape[0] - 1)
             )
-            res.accepted = False
-            res.model_version = self._version
-            return res
 
+    def _report_gradients(
+        self, model_version, dense_grads, indexed_grads, edl_embedding_grads
+    ):
+        """
+        Accumulate the gradients of one report from a worker. The
+        gradients are converted and checked out of the lock, so the model
+        version and variables are checked again under it.
+        """
         # TODO: Update task queue with task_id
         with self._lock:
-            tmp = {}
-            indexed_grads = {}
-            edl_embedding_gradients = {}
-            # Do sanity check before accumulating gradients.
-            for k, v in request.gradient.items():
-                if k not in self._model:
-                    if v.indices:
-                        # grads of ElasticDL Embedding layer
-                        # TODO: check arr.shape[1] = embedding_dim of this
-                        # EdlEmbedding layer
-                        arr = tensor_to_ndarray(v)
-                        edl_embedding_gradients[k] = arr
-                        continue
-                    else:
-                        raise ValueError(
-                            "Gradient key: %s is not part of model", k
-                        )
-
-                arr = tensor_to_ndarray(v)
-                if isinstance(arr, tf.IndexedSlices):
-                    if arr.values.shape[1] != self._model[k].numpy().shape[1]:
-                        raise ValueError(
-                            "Gradient key: %s has incompatible "
-                            "indexed slice dimension %d, expected %d"
-                            % (
-                                k,
-                                arr.values.shape[1],
-                                self._model[k].numpy().shape[1],
-                            )
-                        )
-
-                    max_index = tf.math.reduce_max(arr.indices).numpy()
-                    if max_index >= self._model[k].numpy().shape[0]:
-                        raise ValueError(
-                            "Gradient key: %s has wrong indices %d, "
-                            "out of range %d"
-                            % (
-                                k,
-                                max_index,
-                                self._model[k].numpy().shape[0] - 1,
-                            )
-                        )
-                    indexed_grads[k] = arr
-                else:
-                    if arr.shape != self._model[k].numpy().shape:
-                        raise ValueError(
-                            "Gradient key: %s has incompatible dimension", k
-                        )
-                    tmp[k] = arr
+            # The model may be updated by other reports while this one is
+            # converted and checked.
+            if model_version != self._version:
+                return self._reject_outdated_gradients(model_version)
+
+            # Variables added by `ReportVariable` meanwhile are not
+            # ElasticDL Embedding layers.
+            for k in [k for k in edl_embedding_grads if k in self._model]:
+                arr = edl_embedding_grads.pop(k)
+                self._check_indexed_gradient(k, arr)
+                indexed_grads[k] = arr
 
             # grads of ElasticDL Embedding layer
-            for k, v in edl_embedding_gradients.items():
-                if k in self._edl_embedding_gradients:
-                    self._edl_embedding_gradients[k] = merge_indexed_slices(
-                        self._edl_embedding_gradients[k], v
-                    )
-                else:
-                    self._edl_embedding_gradients[k] = v
+            for k, v in edl_embedding_grads.items():
+                self._edl_embedding_gradients.setdefault(k, []).append(v)
 
             # grads of Keras Embedding layer
             for k, v in indexed_grads.items():
-                if k not in self._gradient_sum_indexed:
-                    self._gradient_sum_indexed[k] = v
-                else:
-                    grads_s = self._gradient_sum_indexed[k]
-                    self._gradient_sum_indexed[k] = merge_indexed_slices(
-                        grads_s, v
-                    )
+                self._gradient_sum_indexed.setdefault(k, []).append(v)
 
             # other grads
-            for k, v in tmp.items():
-                if k in self._gradient_sum:
-                    self._gradient_sum[k] = self._gradient_sum[k] + v
-                else:
-                    self._gradient_sum[k] = v
+            self._accumulate_gradients(dense_grads)
 
             self._grad_n += 1
             if self._grad_n >= self._grad_to_wait:
@@ -401,10 +671,27 @@ class MasterServicer(elasticdl_pb2_grpc.MasterServicer):
                 self._update_evaluation()
                 self._update_checkpoint()
 
+        res = elasticdl_pb2.ReportGradientResponse()
         res.accepted = True
         res.model_version = self._version
         return res
 
+    def _reject_outdated_gradients(self, model_version):
+        logger.warning(
+            "Task result for outdated version %d dropped", model_version
+        )
+        res = elasticdl_pb2.ReportGradientResponse()
+        res.accepted = False
+        res.model_version = self._version
+        return res
+
+    def ReportGradient(self, request, _):
+        if not self._validate_model_version(request.model_version):
+            return self._reject_outdated_gradients(request.model_version)
+        # Do sanity check before accumulating gradients.
+        grads = self._get_gradients(request.gradient)
+        return self._report_gradients(request.model_version, *grads)
+
     def ReportTaskResult(self, request, _):
         if request.err_message:
             logger.warning("Worker reported error: " + request.err_message)
@@ -119,6 +119,8 @@ class CheckpointTest(unittest.TestCase):
 
             worker._stub = InProcessMaster(master)
             worker.run()
+            self.assertTrue(master._checkpoint_thread.is_alive())
+            master.wait_for_checkpoints()
 
             # We should have 5 checkpoints when the training finishes
             checkpoint_files = sorted(os.listdir(checkpointer._directory))
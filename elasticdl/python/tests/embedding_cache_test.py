@@ -0,0 +1,61 @@
+import unittest
+
+import numpy as np
+
+from elasticdl.python.master.embedding_cache import EmbeddingCache
+
+# The cached bytes of a float64 vector of size 2.
+_ENTRY_NBYTES = EmbeddingCache.ENTRY_OVERHEAD_BYTES + 16
+
+
+class EmbeddingCacheTest(unittest.TestCase):
+    def test_lookup_and_update(self):
+        cache = EmbeddingCache(capacity=3 * _ENTRY_NBYTES)
+        vectors, missed_idx = cache.lookup(["a-1", "a-2"])
+        self.assertEqual([None, None], vectors)
+        self.assertEqual([0, 1], missed_idx)
+
+        cache.update(
+            ["a-1", "a-2"], [np.array([1.0, 1.0]), np.array([2.0, 2.0])]
+        )
+        vectors, missed_idx = cache.lookup(["a-2", "a-3", "a-1"])
+        self.assertEqual([1], missed_idx)
+        np.testing.assert_array_equal(np.array([2.0, 2.0]), vectors[0])
+        self.assertIsNone(vectors[1])
+        np.testing.assert_array_equal(np.array([1.0, 1.0]), vectors[2])
+
+        # Update an existing key
+        cache.update(["a-2"], [np.array([3.0, 3.0])])
+        vectors, _ = cache.lookup(["a-2"])
+        np.testing.assert_array_equal(np.array([3.0, 3.0]), vectors[0])
+        self.assertEqual(2 * _ENTRY_NBYTES, cache.nbytes)
+
+    def test_update_with_copies(self):
+        cache = EmbeddingCache(capacity=2 * _ENTRY_NBYTES)
+        embeddings = np.zeros((2, 2))
+        cache.update(["a-1", "a-2"], list(embeddings))
+        embeddings.fill(1.0)
+        vectors, _ = cache.lookup(["a-1", "a-2"])
+        for vector in vectors:
+            np.testing.assert_array_equal(np.zeros(2), vector)
+            # Cached vectors should not keep `embeddings` alive.
+            self.assertIsNone(vector.base)
+
+    def test_evict_least_recently_used(self):
+        cache = EmbeddingCache(capacity=2 * _ENTRY_NBYTES)
+        cache.update(["a-1", "a-2"], [np.zeros(2), np.ones(2)])
+        # "a-1" becomes the most recently used one.
+        cache.lookup(["a-1"])
+        cache.update(["a-3"], [np.ones(2)])
+        self.assertEqual(2, len(cache))
+        self.assertEqual(2 * _ENTRY_NBYTES, cache.nbytes)
+        _, missed_idx = cache.lookup(["a-1", "a-2", "a-3"])
+        self.assertEqual([1], missed_idx)
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.nbytes)
+
+
+if __name__ == "__main__":
+    unittest.main()
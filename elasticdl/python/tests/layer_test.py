@@ -115,6 +115,20 @@ def get_correct_values_for_sparse_test(indices, values, dense_shape, combiner):
 
 
 class EmbeddingLayerTest(unittest.TestCase):
+    def test_get_keys(self):
+        ids = np.array([3, 0, 12], dtype=np.int64)
+        self.assertEqual(
+            [Embedding.get_key(["layer", i]) for i in ids],
+            Embedding.get_keys(["layer"], ids),
+        )
+        self.assertEqual(
+            ["layer-m-3", "layer-m-0", "layer-m-12"],
+            Embedding.get_keys(["layer", "m"], ids),
+        )
+        self.assertEqual(["layer-1"], Embedding.get_keys(["layer"], [1]))
+        # Prefixes of different names should not be mixed up by the cache.
+        self.assertEqual(["layer2-1"], Embedding.get_keys(["layer2"], [1]))
+
     def test_embedding_layer(self):
         output_dim = 8
         embedding_size = 16
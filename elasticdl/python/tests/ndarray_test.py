@@ -1,10 +1,14 @@
 import unittest
 
 import numpy as np
+import tensorflow as tf
 
 from elasticdl.proto import elasticdl_pb2
 from elasticdl.python.common.ndarray import (
     ndarray_to_tensor,
+    ndarrays_to_packed_tensors,
+    packed_tensors_to_ndarrays,
+    pb_model_to_ndarrays,
     tensor_to_ndarray,
 )
 
@@ -39,6 +43,15 @@ class ConverterTest(unittest.TestCase):
         self.assertEqual([2, 1, 3, 4], t.dim)
         self.assertEqual(4 * 2 * 1 * 3 * 4, len(t.content))
 
+    def test_ndarray_to_tensor_in_place(self):
+        model = elasticdl_pb2.Model()
+        model.param["x"].dim.extend([7])
+        arr = np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32)
+        t = ndarray_to_tensor(arr, tensor=model.param["x"])
+        self.assertIs(t, model.param["x"])
+        self.assertEqual([2, 2], t.dim)
+        np.testing.assert_array_equal(arr, tensor_to_ndarray(t))
+
     def testtensor_to_ndarray(self):
         t = elasticdl_pb2.Tensor()
         # No dim defined, should raise.
@@ -72,6 +85,83 @@ class ConverterTest(unittest.TestCase):
             t.content = b"\0" * (4 * 12)
             t.dim.extend([m, 12 // m])
             arr = tensor_to_ndarray(t)
+            # A read-only view on the content, not a copy.
+            self.assertFalse(arr.flags.writeable)
+
+    def test_tensor_to_indexed_slices(self):
+        values = np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32)
+        t = ndarray_to_tensor(values, (3, 1))
+        arr = tensor_to_ndarray(t)
+        self.assertIsInstance(arr, tf.IndexedSlices)
+        self.assertIsInstance(arr.indices, np.ndarray)
+        np.testing.assert_array_equal(np.array([3, 1]), arr.indices)
+        np.testing.assert_array_equal(values, arr.values)
+
+    def test_bfloat16(self):
+        arr = np.array([[1.0, -2.5], [3.015625, 1.0e-3]], dtype=np.float32)
+        t = ndarray_to_tensor(arr, (0, 3), dtype=elasticdl_pb2.BFLOAT16)
+        self.assertEqual(elasticdl_pb2.BFLOAT16, t.dtype)
+        self.assertEqual(2 * 4, len(t.content))
+        slices = tensor_to_ndarray(t)
+        self.assertEqual(np.float32, slices.values.dtype)
+        np.testing.assert_array_equal(np.array([0, 3]), slices.indices)
+        # Values exactly representable in bfloat16 are kept.
+        np.testing.assert_array_equal(arr[:, 0], slices.values[:, 0])
+        np.testing.assert_allclose(arr, slices.values, rtol=1e-2)
+
+        # Values are rounded to the nearest bfloat16, ties to even.
+        arr = np.array(
+            [1.005859375, -1.005859375, 1.00390625, np.inf, np.nan],
+            dtype=np.float32,
+        )
+        t = ndarray_to_tensor(arr, dtype=elasticdl_pb2.BFLOAT16)
+        np.testing.assert_array_equal(
+            np.array([1.0078125, -1.0078125, 1.0, np.inf, np.nan]),
+            tensor_to_ndarray(t),
+        )
+        # A NaN with only lower bits set should not become an infinity.
+        arr = np.array([0x7F800001], dtype=np.uint32).view(np.float32)
+        t = ndarray_to_tensor(arr, dtype=elasticdl_pb2.BFLOAT16)
+        self.assertTrue(np.isnan(tensor_to_ndarray(t)[0]))
+
+    def test_packed_tensors(self):
+        params = {
+            "x": np.array([[1.0, 2.0], [3.0, 4.0]], dtype=np.float32),
+            "y": np.array(5.0, dtype=np.float32),
+            "z": np.ndarray(shape=[2, 0], dtype=np.float32),
+        }
+        packed = ndarrays_to_packed_tensors(params)
+        self.assertEqual(["x", "y", "z"], list(packed.name))
+        self.assertEqual([2, 0, 2], list(packed.ndim))
+        self.assertEqual([2, 2, 2, 0], list(packed.dim))
+        self.assertEqual(4 * 5, len(packed.content))
+        arrays = packed_tensors_to_ndarrays(packed)
+        self.assertEqual(params.keys(), arrays.keys())
+        for k, v in params.items():
+            np.testing.assert_array_equal(v, arrays[k])
+
+        # Wrong type, should raise
+        self.assertRaises(
+            ValueError, ndarrays_to_packed_tensors, {"a": np.array([1, 2])}
+        )
+
+        # Wrong content size, should raise
+        packed.content = b"\0" * (4 * 4)
+        self.assertRaises(ValueError, packed_tensors_to_ndarrays, packed)
+        packed.content = b"\0" * (4 * 6)
+        self.assertRaises(ValueError, packed_tensors_to_ndarrays, packed)
+
+    def test_pb_model_to_ndarrays(self):
+        model = elasticdl_pb2.Model()
+        ndarray_to_tensor(
+            np.array([1.0], dtype=np.float32), tensor=model.param["x"]
+        )
+        ndarrays_to_packed_tensors(
+            {"y": np.array([2.0, 3.0], dtype=np.float32)}, model.packed_param
+        )
+        params = pb_model_to_ndarrays(model)
+        np.testing.assert_array_equal(np.array([1.0]), params["x"])
+        np.testing.assert_array_equal(np.array([2.0, 3.0]), params["y"])
 
     def testRoundTrip(self):
         def verify(a):
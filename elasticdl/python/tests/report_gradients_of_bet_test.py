@@ -6,6 +6,7 @@ import numpy as np
 import tensorflow as tf
 
 from elasticdl.python.common.constants import JobType
+from elasticdl.python.common.tensor_helper import merge_indexed_slices
 from elasticdl.python.master.embedding_service import EmbeddingService
 from elasticdl.python.master.servicer import MasterServicer
 from elasticdl.python.tests.in_process_master import InProcessMaster
@@ -164,7 +165,10 @@ class ReportBETGradientTest(unittest.TestCase):
             ),
         }
 
-        result = master._edl_embedding_gradients
+        result = {
+            k: merge_indexed_slices(*v)
+            for k, v in master._edl_embedding_gradients.items()
+        }
         for name, grads in expected_edlembedding_grads.items():
             self.assertTrue(name in result)
             self.assertTrue(grads.indices.shape == result[name].indices.shape)
@@ -243,14 +247,18 @@ class ReportBETGradientTest(unittest.TestCase):
         indices = tf.convert_to_tensor([0, 1, 0, 2, 0, 2, 3])
 
         master._edl_embedding_gradients = {
-            layer_names[0]: tf.IndexedSlices(grads[:3], indices[:3]),
-            layer_names[1]: tf.IndexedSlices(grads[3:], indices[3:]),
+            layer_names[0]: [tf.IndexedSlices(grads[:3], indices[:3])],
+            layer_names[1]: [
+                tf.IndexedSlices(grads[3:5], indices[3:5]),
+                tf.IndexedSlices(grads[5:], indices[5:]),
+            ],
         }
 
+        lookup_embedding = mock.Mock(
+            side_effect=mock_embedding_service.mock_lookup_embedding
+        )
         with mock.patch.object(
-            EmbeddingService,
-            "lookup_embedding",
-            mock_embedding_service.mock_lookup_embedding,
+            EmbeddingService, "lookup_embedding", lookup_embedding
         ), mock.patch.object(
             EmbeddingService,
             "update_embedding",
@@ -259,6 +267,8 @@ class ReportBETGradientTest(unittest.TestCase):
             with master._lock:
                 assert master._lock.locked()
                 master._update_model()
+        # Embedding vectors of all the layers are looked up together.
+        self.assertEqual(1, lookup_embedding.call_count)
 
         expected_embedding_table = {
             layer_names[0]: np.array(
@@ -283,6 +293,46 @@ class ReportBETGradientTest(unittest.TestCase):
                 ).all()
             )
 
+    def test_report_bet_gradients_with_momentum(self):
+        master = MasterServicer(
+            1,
+            2,
+            tf.optimizers.SGD(0.1, momentum=0.9),
+            None,
+            init_var=[],
+            checkpoint_filename_for_init=None,
+            checkpoint_service=None,
+            evaluation_service=None,
+        )
+        mock_embedding_service = MockEmbeddingService()
+        mock_embedding_service.mock_embedding_table = {
+            "layer": np.zeros((2, 2), dtype=np.float32)
+        }
+        grads = np.ones((1, 2), dtype=np.float32)
+        with mock.patch.object(
+            EmbeddingService,
+            "lookup_embedding",
+            mock_embedding_service.mock_lookup_embedding,
+        ), mock.patch.object(
+            EmbeddingService,
+            "update_embedding",
+            mock_embedding_service.mock_update_embedding,
+        ):
+            # Id 0 and then id 1 are updated, both in the first row of the
+            # embedding variable.
+            for i in range(2):
+                master._edl_embedding_gradients = {
+                    "layer": [tf.IndexedSlices(grads, np.array([i]))]
+                }
+                with master._lock:
+                    master._update_model()
+
+        # The momentum of id 0 should not be applied to id 1.
+        np.testing.assert_array_almost_equal(
+            np.array([[-0.1, -0.1], [-0.1, -0.1]]),
+            mock_embedding_service.mock_embedding_table["layer"],
+        )
+
     def test_get_trainable_variable(self):
         master, worker = self._create_master_and_worker()
         layer = MockEdlEmbedding("test")
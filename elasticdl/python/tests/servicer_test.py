@@ -4,15 +4,19 @@ import tempfile
 import unittest
 from collections import defaultdict
 
+import mock
 import numpy as np
 import tensorflow as tf
 
 from elasticdl.proto import elasticdl_pb2
+from elasticdl.python.common.constants import GradientAggregation
 from elasticdl.python.common.ndarray import (
     ndarray_to_tensor,
+    pb_model_to_ndarrays,
     tensor_to_ndarray,
 )
 from elasticdl.python.master.checkpoint_service import CheckpointService
+from elasticdl.python.master.embedding_service import EmbeddingService
 from elasticdl.python.master.servicer import MasterServicer
 from elasticdl.python.master.task_dispatcher import _TaskDispatcher
 
@@ -154,6 +158,93 @@ class ServicerTest(unittest.TestCase):
                 np.array([12.0, 13.0]), tensor_to_ndarray(model.param["y"])
             )
 
+    def testGetModelCache(self):
+        master = MasterServicer(
+            2,
+            3,
+            None,
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        master.set_model_var("x", np.array([1.0, 1.0], dtype=np.float32))
+
+        req = elasticdl_pb2.GetModelRequest()
+        req.version = 0
+        req.method = elasticdl_pb2.MINIMUM
+        model = master.GetModel(req, None)
+        self.assertEqual(0, master._cached_pb_version)
+        # Consuming the returned model should not affect the cache.
+        tensor_to_ndarray(model.param["x"])
+        model = master.GetModel(req, None)
+        np.testing.assert_array_equal(
+            np.array([1.0, 1.0]), tensor_to_ndarray(model.param["x"])
+        )
+
+        # A model update invalidates the cache.
+        with master._lock:
+            master._update_model_version()
+        self.assertEqual(-1, master._cached_pb_version)
+        master.set_model_var("x", np.array([2.0, 2.0], dtype=np.float32))
+        req.version = 1
+        model = master.GetModel(req, None)
+        self.assertEqual(1, model.version)
+        np.testing.assert_array_equal(
+            np.array([2.0, 2.0]), tensor_to_ndarray(model.param["x"])
+        )
+
+        # The model is serialized out of the lock, it should not be cached
+        # if the variables are changed meanwhile.
+        master._cached_pb_version = -1
+        to_pb_model = MasterServicer._params_to_pb_model
+
+        def set_var_and_convert(version, params, packed=False):
+            master.set_model_var("y", np.array([3.0], dtype=np.float32))
+            return to_pb_model(version, params, packed)
+
+        with mock.patch.object(
+            MasterServicer,
+            "_params_to_pb_model",
+            staticmethod(set_var_and_convert),
+        ):
+            model = master.GetModel(req, None)
+        self.assertEqual(["x"], list(model.param.keys()))
+        self.assertEqual(-1, master._cached_pb_version)
+        model = master.GetModel(req, None)
+        self.assertEqual(["x", "y"], list(sorted(model.param.keys())))
+
+    def testGetPackedModel(self):
+        master = MasterServicer(
+            2,
+            3,
+            None,
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        master.set_model_var("x", np.array([1.0, 1.0], dtype=np.float32))
+        master.set_model_var("y", np.array([[2.0]], dtype=np.float32))
+
+        req = elasticdl_pb2.GetModelRequest()
+        req.version = 0
+        req.method = elasticdl_pb2.MINIMUM
+        req.packed = True
+        model = master.GetModel(req, None)
+        self.assertEqual(0, len(model.param))
+        params = pb_model_to_ndarrays(model)
+        np.testing.assert_array_equal(np.array([1.0, 1.0]), params["x"])
+        np.testing.assert_array_equal(np.array([[2.0]]), params["y"])
+
+        # Packed and unpacked models are cached separately.
+        req.packed = False
+        model = master.GetModel(req, None)
+        self.assertEqual(["x", "y"], list(sorted(model.param.keys())))
+        self.assertEqual({True, False}, set(master._cached_pb_bytes.keys()))
+
     def testReportGradient(self):
         def makeGrad():
             """ Make a ReportGradientRequest compatible with model"""
@@ -246,6 +337,292 @@ class ServicerTest(unittest.TestCase):
             np.array([11.998, 12.996], dtype=np.float32),
             master._model["y"].numpy(),
         )
+        # Checkpointing is disabled, no thread is started for it.
+        self.assertIsNone(master._checkpoint_thread)
+
+    def testSkipGradDivisionForSGD(self):
+        def create_master(grads_to_wait, optimizer):
+            return MasterServicer(
+                grads_to_wait,
+                3,
+                optimizer,
+                None,
+                init_var=[],
+                checkpoint_filename_for_init="",
+                checkpoint_service=CheckpointService("", 0, 0, False),
+                evaluation_service=None,
+            )
+
+        for grads_to_wait, optimizer in (
+            (1, tf.optimizers.SGD(0.1)),
+            (2, tf.optimizers.Adam(0.1)),
+            (2, tf.optimizers.SGD(lambda: 0.1)),
+            (
+                2,
+                tf.optimizers.SGD(
+                    tf.optimizers.schedules.ExponentialDecay(0.1, 10, 0.9)
+                ),
+            ),
+            (2, None),
+        ):
+            master = create_master(grads_to_wait, optimizer)
+            self.assertFalse(master._skip_grad_division)
+
+        x = np.array([1.0, 2.0], dtype=np.float32)
+        y = np.array([[1.0], [2.0], [3.0]], dtype=np.float32)
+        # Two model updates, each of two reports of a dense gradient of
+        # "x" and an indexed gradient of "y".
+        reports = [
+            [([1.0, 2.0], [[1.0]], [2]), ([3.0, 4.0], [[2.0]], [0])],
+            [([0.5, 0.5], [[1.0]], [1]), ([1.5, 0.5], [[3.0]], [2])],
+        ]
+        for momentum in (0.0, 0.9):
+            master = create_master(
+                2, tf.optimizers.SGD(0.1, momentum=momentum)
+            )
+            self.assertTrue(master._skip_grad_division)
+            master.set_model_var("x", x)
+            master.set_model_var("y", y)
+
+            # Dense gradients are averaged, indexed ones are not.
+            opt = tf.optimizers.SGD(0.1, momentum=momentum)
+            x_var, y_var = tf.Variable(x), tf.Variable(y)
+
+            for version, grads in enumerate(reports):
+                for x_grad, y_values, y_indices in grads:
+                    req = elasticdl_pb2.ReportGradientRequest()
+                    req.model_version = version
+                    ndarray_to_tensor(
+                        np.array(x_grad, dtype=np.float32),
+                        tensor=req.gradient["x"],
+                    )
+                    ndarray_to_tensor(
+                        np.array(y_values, dtype=np.float32),
+                        y_indices,
+                        tensor=req.gradient["y"],
+                    )
+                    res = master.ReportGradient(req, None)
+                    self.assertTrue(res.accepted)
+                self.assertEqual(version + 1, res.model_version)
+
+                x_grads = np.array([g[0] for g in grads], dtype=np.float32)
+                y_grads = tf.IndexedSlices(
+                    np.array([v for g in grads for v in g[1]], np.float32),
+                    np.array([i for g in grads for i in g[2]]),
+                )
+                opt.apply_gradients(
+                    [(x_grads.mean(axis=0), x_var), (y_grads, y_var)]
+                )
+                np.testing.assert_array_almost_equal(
+                    x_var.numpy(), master._model["x"].numpy()
+                )
+                np.testing.assert_array_almost_equal(
+                    y_var.numpy(), master._model["y"].numpy()
+                )
+
+    def testReportOutdatedGradient(self):
+        master = MasterServicer(
+            2,
+            3,
+            tf.optimizers.SGD(0.1),
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        master._version = 1
+        master.set_model_var("x", np.array([2.0], dtype=np.float32))
+        req = elasticdl_pb2.ReportGradientRequest()
+        ndarray_to_tensor(
+            np.array([0.1], dtype=np.float32), tensor=req.gradient["x"]
+        )
+        req.model_version = 1
+
+        # The model is updated by other reports while this report is being
+        # checked out of the lock, it should not be accepted.
+        get_gradients = master._get_gradients
+
+        def update_model_and_get_gradients(gradients):
+            with master._lock:
+                master._update_model_version()
+            return get_gradients(gradients)
+
+        with mock.patch.object(
+            master, "_get_gradients", update_model_and_get_gradients
+        ):
+            res = master.ReportGradient(req, None)
+        self.assertFalse(res.accepted)
+        self.assertEqual(2, res.model_version)
+        self.assertEqual(0, master._grad_n)
+        self.assertFalse(master._gradient_sum)
+
+    def testReportGradientDuringReportVariable(self):
+        master = MasterServicer(
+            2,
+            3,
+            None,
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        req = elasticdl_pb2.ReportGradientRequest()
+        ndarray_to_tensor(
+            np.array([[0.1, 0.2]], dtype=np.float32),
+            (1,),
+            tensor=req.gradient["x"],
+        )
+        # "x" is not a model variable yet when the gradient is checked.
+        grads = master._get_gradients(req.gradient)
+        self.assertIn("x", grads[2])
+        master.set_model_var("x", np.zeros((2, 2), dtype=np.float32))
+        res = master._report_gradients(0, *grads)
+        self.assertTrue(res.accepted)
+        self.assertIn("x", master._gradient_sum_indexed)
+        self.assertFalse(master._edl_embedding_gradients)
+
+    def testAccumulateGradientsInChunks(self):
+        master = MasterServicer(
+            3,
+            3,
+            None,
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        x = np.arange(10, dtype=np.float32).reshape(2, 5)
+        y = np.array([1.0, 2.0], dtype=np.float32)
+        # Gradients not split into chunks do not need the thread pool.
+        with master._lock:
+            master._accumulate_gradients({"y": y})
+        self.assertIsNone(master._aggregation_pool)
+        master._gradient_sum.clear()
+
+        with mock.patch.object(
+            GradientAggregation, "CHUNK_SIZE", 3
+        ), master._lock:
+            for _ in range(3):
+                master._accumulate_gradients({"x": x, "y": y})
+        self.assertIsNotNone(master._aggregation_pool)
+        np.testing.assert_array_equal(x * 3, master._gradient_sum["x"])
+        np.testing.assert_array_equal(y * 3, master._gradient_sum["y"])
+        # The reported gradients should not be modified.
+        np.testing.assert_array_equal(
+            np.arange(10, dtype=np.float32).reshape(2, 5), x
+        )
+
+    def testAccumulateSingleGradientWithoutCopy(self):
+        master = MasterServicer(
+            1,
+            3,
+            None,
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        x = tensor_to_ndarray(
+            ndarray_to_tensor(np.array([1.0, 2.0], dtype=np.float32))
+        )
+        with master._lock:
+            master._accumulate_gradients({"x": x})
+        self.assertIs(x, master._gradient_sum["x"])
+
+    def testStackEdlEmbeddings(self):
+        master = MasterServicer(
+            2,
+            3,
+            None,
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        emb = np.arange(6, dtype=np.float32).reshape(3, 2)
+        np.testing.assert_array_equal(
+            emb, master._stack_edl_embeddings("layer", list(emb))
+        )
+        buf = master._edl_embedding_buffers["layer"]
+        # Embedding vectors in shape (1, dim) are also supported.
+        np.testing.assert_array_equal(
+            emb[:2],
+            master._stack_edl_embeddings(
+                "layer", [e.reshape(1, -1) for e in emb[:2]]
+            ),
+        )
+        self.assertIs(buf, master._edl_embedding_buffers["layer"])
+
+    def testLookupEdlEmbeddings(self):
+        def lookup_embedding(**kwargs):
+            return [np.ones(2) for _ in kwargs["keys"]], []
+
+        for capacity, lookup_count in ((1024 * 1024, 1), (0, 2)):
+            master = MasterServicer(
+                2,
+                3,
+                None,
+                None,
+                init_var=[],
+                checkpoint_filename_for_init="",
+                checkpoint_service=CheckpointService("", 0, 0, False),
+                evaluation_service=None,
+                embedding_cache_capacity=capacity,
+            )
+            lookup = mock.Mock(side_effect=lookup_embedding)
+            with mock.patch.object(
+                EmbeddingService, "lookup_embedding", lookup
+            ):
+                for _ in range(2):
+                    embeddings = master._lookup_edl_embeddings(["l-1", "l-2"])
+                    self.assertEqual(2, len(embeddings))
+            # The cache is disabled if its capacity is 0.
+            self.assertEqual(lookup_count, lookup.call_count)
+
+    def testGetEdlEmbeddingVar(self):
+        master = MasterServicer(
+            2,
+            3,
+            tf.optimizers.SGD(0.1),
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        emb = np.arange(6, dtype=np.float32).reshape(3, 2)
+        var = master._get_edl_embedding_var("layer", emb)
+        np.testing.assert_array_equal(emb, var.numpy())
+
+        # Fewer ids reuse the same variable.
+        self.assertIs(var, master._get_edl_embedding_var("layer", emb[:2]))
+        np.testing.assert_array_equal(emb[:2], var[:2].numpy())
+
+        # More ids than the capacity re-create a larger variable.
+        emb = np.ones((4, 2), dtype=np.float32)
+        var = master._get_edl_embedding_var("layer", emb)
+        self.assertEqual([6, 2], var.shape.as_list())
+        np.testing.assert_array_equal(emb, var[:4].numpy())
+
+        # Variables are not reused with optimizers with slots.
+        master = MasterServicer(
+            2,
+            3,
+            tf.optimizers.SGD(0.1, momentum=0.9),
+            None,
+            init_var=[],
+            checkpoint_filename_for_init="",
+            checkpoint_service=CheckpointService("", 0, 0, False),
+            evaluation_service=None,
+        )
+        var = master._get_edl_embedding_var("layer", emb)
+        np.testing.assert_array_equal(emb, var.numpy())
+        self.assertIsNot(var, master._get_edl_embedding_var("layer", emb))
 
     def testReportTaskResult(self):
         task_d = _TaskDispatcher(
@@ -79,6 +79,13 @@ def _parse_args():
         help="The endpoint of embedding service, "
         "e.g. \"{'ip_0': [port_0,port_1]}\"",
     )
+    parser.add_argument(
+        "--embedding_grads_dtype",
+        choices=["float32", "bfloat16"],
+        default="float32",
+        help="The data type used to report the gradients of embedding "
+        "layers to master",
+    )
 
     return parser.parse_args()
 
@@ -112,6 +119,7 @@ def main():
         eval_metrics_fn=args.eval_metrics_fn,
         model_def=args.model_def,
         model_params=args.model_params,
+        embedding_grads_dtype=args.embedding_grads_dtype,
     )
     worker.run()
 
@@ -9,7 +9,7 @@ from elasticdl.python.common.log_util import default_logger as logger
 from elasticdl.python.common.model_helper import find_layer, get_model_spec
 from elasticdl.python.common.ndarray import (
     ndarray_to_tensor,
-    tensor_to_ndarray,
+    pb_model_to_ndarrays,
 )
 from elasticdl.python.elasticdl.layers.embedding import Embedding
 from elasticdl.python.master.embedding_service import EmbeddingService
@@ -39,6 +39,7 @@ class Worker(object):
         model_params="",
         prediction_outputs_processor="PredictionOutputsProcessor",
         max_minibatch_retry_num=DEFAULT_MAX_MINIBATCH_RETRY_NUM,
+        embedding_grads_dtype="float32",
     ):
         """
         Arguments:
@@ -46,6 +47,8 @@ class Worker(object):
             channel: grpc channel
             max_minibatch_retry_num: The maximum number of a minibatch retry
                 as its results (e.g. gradients) are not accepted by master.
+            embedding_grads_dtype: The data type, "float32" or "bfloat16",
+                used to report the gradients of embedding layers.
         """
         self._worker_id = worker_id
         self._job_type = job_type
@@ -76,6 +79,9 @@ class Worker(object):
             self._stub = elasticdl_pb2_grpc.MasterStub(channel)
         self._embedding_service_endpoint = embedding_service_endpoint
         self._max_minibatch_retry_num = max_minibatch_retry_num
+        self._embedding_grads_dtype = elasticdl_pb2.TensorDtype.Value(
+            embedding_grads_dtype.upper()
+        )
         self._model_version = -1
         self._task_data_service = TaskDataService(
             self, self._job_type == JobType.TRAINING_WITH_EVALUATION
@@ -116,17 +122,19 @@ class Worker(object):
         req = elasticdl_pb2.GetModelRequest()
         req.version = version
         req.method = method
+        req.packed = True
         model = self._stub.GetModel(req)
 
+        params = pb_model_to_ndarrays(model)
         for var in self._model.trainable_variables:
-            # Assumes all trainable variables exist in model.param.
-            var.assign(tensor_to_ndarray(model.param[var.name]))
+            # Assumes all trainable variables exist in the model.
+            var.assign(params[var.name])
         self._model_version = model.version
 
     def lookup_embedding(
         self, ids, layer_name, initializer="uniform", embedding_table_dim=128
     ):
-        keys = [Embedding.get_key([layer_name, id]) for id in ids]
+        keys = Embedding.get_keys([layer_name], ids)
         ES_lookup_embedding = EmbeddingService.lookup_embedding
         embedding_vectors, unknown_keys_index = ES_lookup_embedding(
             keys=keys,
@@ -183,12 +191,14 @@ class Worker(object):
         """
         req = elasticdl_pb2.ReportVariableRequest()
         for v in self._model.trainable_variables:
-            req.variable[v.name].CopyFrom(ndarray_to_tensor(v.numpy()))
+            ndarray_to_tensor(v.numpy(), tensor=req.variable[v.name])
         self._stub.ReportVariable(req)
 
     def report_gradient(self, grads):
         """
         report gradient to ps, return (accepted, model_version) from rpc call.
+        Gradients of embedding layers, i.e. the ones with indices, are
+        reported in `self._embedding_grads_dtype`.
         """
         req = elasticdl_pb2.ReportGradientRequest()
         origin_vars = self._model.trainable_variables
@@ -196,13 +206,14 @@ class Worker(object):
         # should keep the same order as self.get_trainable_items()
         for g, v in zip(grads[:origin_var_n], origin_vars):
             if isinstance(g, tf.IndexedSlices):
-                req.gradient[v.name].CopyFrom(
-                    ndarray_to_tensor(
-                        g.values.numpy(), tuple(g.indices.numpy())
-                    )
+                ndarray_to_tensor(
+                    g.values.numpy(),
+                    tuple(g.indices.numpy()),
+                    tensor=req.gradient[v.name],
+                    dtype=self._embedding_grads_dtype,
                 )
             else:
-                req.gradient[v.name].CopyFrom(ndarray_to_tensor(g.numpy()))
+                ndarray_to_tensor(g.numpy(), tensor=req.gradient[v.name])
 
         # deal with gradients of ElasticDL embedding layer
         # should keep the same order as self.get_trainable_items()
@@ -236,10 +247,11 @@ class Worker(object):
                         g_values = grad
                         g_indices = ids
 
-                req.gradient[layer.name].CopyFrom(
-                    ndarray_to_tensor(
-                        g_values.numpy(), tuple(g_indices.numpy())
-                    )
+                ndarray_to_tensor(
+                    g_values.numpy(),
+                    tuple(g_indices.numpy()),
+                    tensor=req.gradient[layer.name],
+                    dtype=self._embedding_grads_dtype,
                 )
 
         req.model_version = self._model_version